@@ -1,29 +1,75 @@
 #!/usr/bin/env python3
 import argparse
+import calendar
 import csv
-import datetime as dt
+import mmap
 import os
 import re
-from collections import defaultdict
+from collections import defaultdict, namedtuple
 from pathlib import Path
 
-SHOW_PARSER = argparse.ArgumentParser(add_help=False)
-SHOW_PARSER.add_argument("--show", action="store_true")
-SHOW_ARGS, _ = SHOW_PARSER.parse_known_args()
-SHOW_ENABLED = SHOW_ARGS.show and bool(os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY"))
-
-import matplotlib
-
-if not SHOW_ENABLED:
-    matplotlib.use("Agg")
-import matplotlib.pyplot as plt
+import numpy as np
 
 DEFAULT_RESIDUAL_THRESHOLD = 0.012
 DEFAULT_PLOT_RESIDUAL_THRESHOLD = 0.013
+CSV_BUFFER_SIZE = 1 << 20
+
+STAT_FIELDS = (
+    "image_total",
+    "image_drop",
+    "lio_total",
+    "lio_degenerate",
+    "lio_residual_sum",
+    "lio_residual_count",
+    "lio_residual_max",
+    "vio_total",
+    "vio_max_points",
+    "vio_age",
+)
+(
+    I_IMAGE_TOTAL,
+    I_IMAGE_DROP,
+    I_LIO_TOTAL,
+    I_LIO_DEGENERATE,
+    I_LIO_RESIDUAL_SUM,
+    I_LIO_RESIDUAL_COUNT,
+    I_LIO_RESIDUAL_MAX,
+    I_VIO_TOTAL,
+    I_VIO_MAX_POINTS,
+    I_VIO_AGE,
+) = range(len(STAT_FIELDS))
+ZERO_ROW = (0, 0, 0, 0, 0.0, 0, 0.0, 0, 0, 0)
+
+RUNTIME_LOG_RE = re.compile(
+    rb"\[(?:(?P<image>(?P<image_label>Image Use|Image Drop)\].*utc=(?P<image_utc>\d{8}_\d{6}))"
+    rb"|(?P<lio>LIO Degenerate\].*utc=(?P<lio_utc>\d{8}_\d{6})"
+    rb".*avg_residual=(?P<avg_residual>[0-9.eE+-]+)"
+    rb"(?:.*thresh_residual=(?P<thresh_residual>[0-9.eE+-]+))?"
+    rb".*degenerate=(?P<degenerate>\d))"
+    rb"|(?P<vio>VIO Prune\].*utc=(?P<vio_utc>\d{8}_\d{6}).*reason=(?P<reason>[a-z_]+)))",
+    re.ASCII,
+)
+
+RuntimeStats = namedtuple(
+    "RuntimeStats",
+    (
+        "image_total",
+        "image_drop",
+        "image_drop_rate",
+        "lio_total",
+        "lio_degenerate",
+        "lio_degenerate_ratio",
+        "lio_avg_residual",
+        "lio_max_residual",
+        "vio_prune_total",
+        "vio_prune_max_points",
+        "vio_prune_age",
+    ),
+)
 
 
 def find_latest_log(log_dir: Path) -> Path:
-    candidates = sorted(log_dir.glob("runtime_log_*.txt"), key=lambda path: path.stat().st_mtime)
+    candidates = sorted(log_dir.glob("runtime_log_*.txt"), key=lambda path: path.name)
     if not candidates:
         raise FileNotFoundError(f"No runtime_log_*.txt found in {log_dir}")
     return candidates[-1]
@@ -36,216 +82,178 @@ def extract_log_timestamp(log_path: Path) -> str:
     return log_path.stem
 
 
+def interpolate_crossings(times_sec, values, indices, threshold):
+    t0 = times_sec[indices]
+    t1 = times_sec[indices + 1]
+    v0 = values[indices]
+    v1 = values[indices + 1]
+    slope = np.divide(t1 - t0, v1 - v0, out=np.zeros(len(indices)), where=v1 != v0)
+    return t0 + (threshold - v0) * slope
+
+
+def residual_segment_bounds(times_sec, values, threshold):
+    above = values > threshold
+    edges = np.diff(above.astype(np.int8))
+    ups = np.flatnonzero(edges == 1)
+    downs = np.flatnonzero(edges == -1)
+    starts = interpolate_crossings(times_sec, values, ups, threshold)
+    ends = interpolate_crossings(times_sec, values, downs, threshold)
+    if above[0]:
+        starts = np.concatenate(([times_sec[0]], starts))
+    if above[-1]:
+        ends = np.concatenate((ends, [times_sec[-1]]))
+    return starts, ends
+
+
 def find_residual_segments(times_sec, avg_residuals, threshold):
-    if not times_sec:
+    times_sec = np.asarray(times_sec, np.float64)
+    values = np.asarray(avg_residuals, np.float64)
+    if len(times_sec) == 0:
         return []
-    segments = []
-    above = avg_residuals[0] > threshold
-    start = times_sec[0] if above else None
-    for idx in range(1, len(times_sec)):
-        v0 = avg_residuals[idx - 1]
-        v1 = avg_residuals[idx]
-        t0 = times_sec[idx - 1]
-        t1 = times_sec[idx]
-        if not above and v1 > threshold:
-            t_cross = t0 if v1 == v0 else t0 + (threshold - v0) * (t1 - t0) / (v1 - v0)
-            start = t_cross
-            above = True
-        elif above and v1 <= threshold:
-            t_cross = t0 if v1 == v0 else t0 + (threshold - v0) * (t1 - t0) / (v1 - v0)
-            segments.append((start, t_cross))
-            above = False
-    if above and start is not None:
-        segments.append((start, times_sec[-1]))
-    return segments
+    starts, ends = residual_segment_bounds(times_sec, values, threshold)
+    return list(zip(starts.tolist(), ends.tolist()))
 
 
-def parse_log(log_path: Path):
-    image_re = re.compile(r"\[(Image Use|Image Drop)\].*utc=(\d{8}_\d{6})")
-    lio_re = re.compile(
-        r"\[LIO Degenerate\].*utc=(\d{8}_\d{6}).*avg_residual=([0-9.eE+-]+).*degenerate=(\d)"
+def utc_to_epoch(utc):
+    return calendar.timegm(
+        (int(utc[0:4]), int(utc[4:6]), int(utc[6:8]), int(utc[9:11]), int(utc[11:13]), int(utc[13:15]), 0, 0, 0)
     )
-    thresh_re = re.compile(r"thresh_residual=([0-9.eE+-]+)")
-    vio_re = re.compile(r"\[VIO Prune\].*utc=(\d{8}_\d{6}).*reason=([a-z_]+)")
-
-    stats = defaultdict(
-        lambda: {
-            "image_total": 0,
-            "image_drop": 0,
-            "lio_total": 0,
-            "lio_degenerate": 0,
-            "lio_residual_sum": 0.0,
-            "lio_residual_count": 0,
-            "lio_residual_max": 0.0,
-            "vio_total": 0,
-            "vio_max_points": 0,
-            "vio_age": 0,
-        }
+
+
+def format_utc_labels(start_epoch, seconds):
+    stamps = np.datetime_as_string(np.datetime64(start_epoch, "s") + np.arange(seconds))
+    stamps = np.char.replace(np.char.replace(stamps, "-", ""), ":", "")
+    return np.char.replace(stamps, "T", "_").tolist()
+
+
+def safe_ratio(numerator, denominator):
+    return np.divide(
+        numerator,
+        denominator,
+        out=np.zeros(len(denominator), np.float64),
+        where=denominator > 0,
     )
 
+
+def iter_log_matches(log_path: Path, pattern):
+    with log_path.open("rb") as handle:
+        try:
+            log_data = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            yield from pattern.finditer(handle.read())
+            return
+        with log_data:
+            yield from pattern.finditer(log_data)
+
+
+def parse_log(log_path: Path):
+    stats = defaultdict(lambda: list(ZERO_ROW))
+
     residual_threshold = None
 
-    with log_path.open("r") as handle:
-        for raw_line in handle:
-            line = raw_line.strip()
-            if not line:
-                continue
-            image_match = image_re.search(line)
-            if image_match:
-                label, utc = image_match.groups()
-                stats[utc]["image_total"] += 1
-                if label == "Image Drop":
-                    stats[utc]["image_drop"] += 1
-                continue
-            lio_match = lio_re.search(line)
-            if lio_match:
-                utc, avg_residual, degenerate = lio_match.groups()
-                avg_residual = float(avg_residual)
-                stats[utc]["lio_total"] += 1
-                stats[utc]["lio_residual_sum"] += avg_residual
-                stats[utc]["lio_residual_count"] += 1
-                stats[utc]["lio_residual_max"] = max(stats[utc]["lio_residual_max"], avg_residual)
-                if degenerate == "1":
-                    stats[utc]["lio_degenerate"] += 1
-                if residual_threshold is None:
-                    thresh_match = thresh_re.search(line)
-                    if thresh_match:
-                        residual_threshold = float(thresh_match.group(1))
-                continue
-            vio_match = vio_re.search(line)
-            if vio_match:
-                utc, reason = vio_match.groups()
-                stats[utc]["vio_total"] += 1
-                if reason == "max_points":
-                    stats[utc]["vio_max_points"] += 1
-                elif reason == "age":
-                    stats[utc]["vio_age"] += 1
-                continue
+    for match in iter_log_matches(log_path, RUNTIME_LOG_RE):
+        kind = match.lastgroup
+        if kind == "image":
+            row = stats[match["image_utc"]]
+            row[I_IMAGE_TOTAL] += 1
+            if match["image_label"] == b"Image Drop":
+                row[I_IMAGE_DROP] += 1
+        elif kind == "lio":
+            row = stats[match["lio_utc"]]
+            avg_residual = float(match["avg_residual"])
+            row[I_LIO_TOTAL] += 1
+            row[I_LIO_RESIDUAL_SUM] += avg_residual
+            row[I_LIO_RESIDUAL_COUNT] += 1
+            if avg_residual > row[I_LIO_RESIDUAL_MAX]:
+                row[I_LIO_RESIDUAL_MAX] = avg_residual
+            if match["degenerate"] == b"1":
+                row[I_LIO_DEGENERATE] += 1
+            if residual_threshold is None and match["thresh_residual"] is not None:
+                residual_threshold = float(match["thresh_residual"])
+        else:
+            row = stats[match["vio_utc"]]
+            reason = match["reason"]
+            row[I_VIO_TOTAL] += 1
+            if reason == b"max_points":
+                row[I_VIO_MAX_POINTS] += 1
+            elif reason == b"age":
+                row[I_VIO_AGE] += 1
 
     if not stats:
         raise ValueError(f"No runtime log entries parsed in {log_path}")
 
-    ordered_keys = sorted(stats.keys())
-    start_time = dt.datetime.strptime(ordered_keys[0], "%Y%m%d_%H%M%S")
-    end_time = dt.datetime.strptime(ordered_keys[-1], "%Y%m%d_%H%M%S")
-    ordered_times = []
-    current_time = start_time
-    while current_time <= end_time:
-        ordered_times.append(current_time)
-        current_time += dt.timedelta(seconds=1)
+    epochs = {utc: utc_to_epoch(utc) for utc in stats}
+    start_epoch = min(epochs.values())
+    seconds = max(epochs.values()) - start_epoch + 1
+    indices = np.fromiter(epochs.values(), np.int64, len(epochs)) - start_epoch
+
+    counters = np.zeros((seconds, len(STAT_FIELDS)), np.float64)
+    counters[indices] = list(stats.values())
+    counts = counters.astype(np.int32)
+    runtime_stats = RuntimeStats(
+        image_total=counts[:, I_IMAGE_TOTAL],
+        image_drop=counts[:, I_IMAGE_DROP],
+        image_drop_rate=safe_ratio(counts[:, I_IMAGE_DROP], counts[:, I_IMAGE_TOTAL]),
+        lio_total=counts[:, I_LIO_TOTAL],
+        lio_degenerate=counts[:, I_LIO_DEGENERATE],
+        lio_degenerate_ratio=safe_ratio(counts[:, I_LIO_DEGENERATE], counts[:, I_LIO_TOTAL]),
+        lio_avg_residual=safe_ratio(counters[:, I_LIO_RESIDUAL_SUM], counts[:, I_LIO_RESIDUAL_COUNT]),
+        lio_max_residual=counters[:, I_LIO_RESIDUAL_MAX],
+        vio_prune_total=counts[:, I_VIO_TOTAL],
+        vio_prune_max_points=counts[:, I_VIO_MAX_POINTS],
+        vio_prune_age=counts[:, I_VIO_AGE],
+    )
+
+    ordered_utcs = format_utc_labels(start_epoch, seconds)
 
-    return stats, ordered_times, start_time, residual_threshold
+    return runtime_stats, ordered_utcs, residual_threshold
 
 
-def write_csv(log_path: Path, stats, ordered_times, start_time):
+def write_csv(log_path: Path, stats, ordered_utcs):
     csv_path = log_path.with_name(log_path.stem + "_stats.csv")
-    with csv_path.open("w", newline="") as csv_file:
+    with csv_path.open("w", newline="", buffering=CSV_BUFFER_SIZE) as csv_file:
         writer = csv.writer(csv_file)
-        writer.writerow(
-            [
-                "utc",
-                "seconds_from_start",
-                "image_total",
-                "image_drop",
-                "image_drop_rate",
-                "lio_total",
-                "lio_degenerate",
-                "lio_degenerate_ratio",
-                "lio_avg_residual",
-                "lio_max_residual",
-                "vio_prune_total",
-                "vio_prune_max_points",
-                "vio_prune_age",
-            ]
-        )
-        for current_time in ordered_times:
-            utc = current_time.strftime("%Y%m%d_%H%M%S")
-            row = stats.get(
-                utc,
-                {
-                    "image_total": 0,
-                    "image_drop": 0,
-                    "lio_total": 0,
-                    "lio_degenerate": 0,
-                    "lio_residual_sum": 0.0,
-                    "lio_residual_count": 0,
-                    "lio_residual_max": 0.0,
-                    "vio_total": 0,
-                    "vio_max_points": 0,
-                    "vio_age": 0,
-                },
-            )
-            image_total = row["image_total"]
-            image_drop = row["image_drop"]
-            lio_total = row["lio_total"]
-            lio_degenerate = row["lio_degenerate"]
-            vio_total = row["vio_total"]
-            drop_rate = image_drop / image_total if image_total else 0.0
-            lio_ratio = lio_degenerate / lio_total if lio_total else 0.0
-            lio_residual_count = row["lio_residual_count"]
-            lio_avg_residual = (
-                row["lio_residual_sum"] / lio_residual_count if lio_residual_count else 0.0
-            )
-            seconds_from_start = int((current_time - start_time).total_seconds())
-            writer.writerow(
-                [
-                    utc,
-                    seconds_from_start,
-                    image_total,
-                    image_drop,
-                    f"{drop_rate:.6f}",
-                    lio_total,
-                    lio_degenerate,
-                    f"{lio_ratio:.6f}",
-                    f"{lio_avg_residual:.6f}",
-                    f"{row['lio_residual_max']:.6f}",
-                    vio_total,
-                    row["vio_max_points"],
-                    row["vio_age"],
-                ]
+        writer.writerow(["utc", "seconds_from_start", *RuntimeStats._fields])
+        writer.writerows(
+            zip(
+                ordered_utcs,
+                range(len(ordered_utcs)),
+                stats.image_total.tolist(),
+                stats.image_drop.tolist(),
+                np.char.mod("%.6f", stats.image_drop_rate),
+                stats.lio_total.tolist(),
+                stats.lio_degenerate.tolist(),
+                np.char.mod("%.6f", stats.lio_degenerate_ratio),
+                np.char.mod("%.6f", stats.lio_avg_residual),
+                np.char.mod("%.6f", stats.lio_max_residual),
+                stats.vio_prune_total.tolist(),
+                stats.vio_prune_max_points.tolist(),
+                stats.vio_prune_age.tolist(),
             )
+        )
     return csv_path
 
 
 def write_plot(
     log_path: Path,
     stats,
-    ordered_times,
-    start_time,
     summary,
     show,
     residual_threshold,
     plot_threshold,
 ):
-    times_sec = []
-    drop_rates = []
-    vio_counts = []
-    avg_residuals = []
-    for current_time in ordered_times:
-        utc = current_time.strftime("%Y%m%d_%H%M%S")
-        row = stats.get(
-            utc,
-            {
-                "image_total": 0,
-                "image_drop": 0,
-                "lio_total": 0,
-                "lio_degenerate": 0,
-                "lio_residual_sum": 0.0,
-                "lio_residual_count": 0,
-                "vio_total": 0,
-            },
-        )
-        image_total = row["image_total"]
-        image_drop = row["image_drop"]
-        drop_rates.append(image_drop / image_total if image_total else 0.0)
-        vio_counts.append(row["vio_total"])
-        lio_residual_count = row["lio_residual_count"]
-        avg_residuals.append(
-            row["lio_residual_sum"] / lio_residual_count if lio_residual_count else 0.0
-        )
-        times_sec.append((current_time - start_time).total_seconds())
+    times_sec = np.arange(len(stats.image_total), dtype=np.float64)
+    drop_rates = stats.image_drop_rate
+    vio_counts = stats.vio_prune_total
+    avg_residuals = stats.lio_avg_residual
+
+    import matplotlib
 
-    fig, axes = plt.subplots(3, 1, figsize=(10, 9), sharex=True)
+    if not show:
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    fig, axes = plt.subplots(3, 1, figsize=(10, 9), sharex=True, constrained_layout=True)
     axes[0].plot(times_sec, drop_rates, color="#d95f02")
     axes[0].set_ylabel("Drop rate")
     axes[0].set_ylim(0, 1)
@@ -262,7 +270,7 @@ def write_plot(
         times_sec,
         plot_threshold,
         avg_residuals,
-        where=[value > plot_threshold for value in avg_residuals],
+        where=avg_residuals > plot_threshold,
         color="#b2df8a",
         alpha=0.35,
         interpolate=True,
@@ -270,59 +278,34 @@ def write_plot(
     axes[1].set_ylabel("Avg residual")
     axes[1].grid(True, alpha=0.3)
 
-    axes[2].bar(times_sec, vio_counts, color="#7570b3", width=0.8)
+    axes[2].bar(times_sec, vio_counts, width=1.0, align="edge", color="#7570b3", linewidth=0)
     axes[2].set_ylabel("VIO prune count")
     axes[2].set_xlabel("Seconds from start")
     axes[2].grid(True, alpha=0.3)
 
     fig.suptitle(extract_log_timestamp(log_path))
-    fig.tight_layout(rect=[0, 0, 1, 0.95])
     plot_path = log_path.with_name(log_path.stem + "_plot.png")
-    fig.savefig(plot_path, dpi=150)
+    fig.savefig(plot_path, dpi=100)
     if show:
         plt.show()
     plt.close(fig)
     return plot_path
 
 
-def summarize_stats(stats, ordered_times, start_time, residual_threshold):
-    drop_rates = []
-    lio_ratios = []
-    avg_residuals = []
-    vio_counts = []
-    for current_time in ordered_times:
-        utc = current_time.strftime("%Y%m%d_%H%M%S")
-        row = stats.get(
-            utc,
-            {
-                "image_total": 0,
-                "image_drop": 0,
-                "lio_total": 0,
-                "lio_degenerate": 0,
-                "lio_residual_sum": 0.0,
-                "lio_residual_count": 0,
-                "vio_total": 0,
-            },
-        )
-        image_total = row["image_total"]
-        image_drop = row["image_drop"]
-        lio_total = row["lio_total"]
-        lio_degenerate = row["lio_degenerate"]
-        lio_residual_count = row["lio_residual_count"]
-        avg_residual = row["lio_residual_sum"] / lio_residual_count if lio_residual_count else 0.0
-        drop_rates.append(image_drop / image_total if image_total else 0.0)
-        lio_ratios.append(lio_degenerate / lio_total if lio_total else 0.0)
-        avg_residuals.append(avg_residual)
-        vio_counts.append(row["vio_total"])
-
-    seconds = len(ordered_times)
-    drop_rate_avg = sum(drop_rates) / seconds if seconds else 0.0
-    drop_rate_max = max(drop_rates) if drop_rates else 0.0
-    lio_ratio_avg = sum(lio_ratios) / seconds if seconds else 0.0
-    lio_ratio_max = max(lio_ratios) if lio_ratios else 0.0
-    vio_total = sum(vio_counts)
-    vio_max = max(vio_counts) if vio_counts else 0
-    degenerate_seconds = sum(1 for value in avg_residuals if value > residual_threshold)
+def summarize_stats(stats, residual_threshold):
+    drop_rates = stats.image_drop_rate
+    lio_ratios = stats.lio_degenerate_ratio
+    avg_residuals = stats.lio_avg_residual
+    vio_counts = stats.vio_prune_total
+
+    seconds = len(drop_rates)
+    drop_rate_avg = float(drop_rates.mean()) if seconds else 0.0
+    drop_rate_max = float(drop_rates.max()) if seconds else 0.0
+    lio_ratio_avg = float(lio_ratios.mean()) if seconds else 0.0
+    lio_ratio_max = float(lio_ratios.max()) if seconds else 0.0
+    vio_total = int(vio_counts.sum())
+    vio_max = int(vio_counts.max()) if seconds else 0
+    degenerate_seconds = int(np.count_nonzero(avg_residuals > residual_threshold))
     degenerate_time_ratio = degenerate_seconds / seconds if seconds else 0.0
 
     return {
@@ -343,6 +326,7 @@ def main():
     parser.add_argument("--log", type=Path, default=None)
     parser.add_argument("--log-dir", type=Path, default=Path(__file__).resolve().parent)
     parser.add_argument("--show", action="store_true", help="Display plot window")
+    parser.add_argument("--no-plot", action="store_true", help="Only write the CSV and summary")
     parser.add_argument(
         "--residual-threshold",
         type=float,
@@ -356,6 +340,7 @@ def main():
         help="Override plot residual threshold",
     )
     args = parser.parse_args()
+    show_enabled = args.show and bool(os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY"))
 
     log_path = args.log
     if log_path is None:
@@ -363,29 +348,28 @@ def main():
     if not log_path.exists():
         raise FileNotFoundError(f"Missing log file: {log_path}")
 
-    stats, ordered_times, start_time, _ = parse_log(log_path)
+    stats, ordered_utcs, _ = parse_log(log_path)
     residual_threshold = args.residual_threshold if args.residual_threshold is not None else DEFAULT_RESIDUAL_THRESHOLD
     plot_threshold = (
         args.plot_residual_threshold
         if args.plot_residual_threshold is not None
         else DEFAULT_PLOT_RESIDUAL_THRESHOLD
     )
-    summary = summarize_stats(stats, ordered_times, start_time, residual_threshold)
-    csv_path = write_csv(log_path, stats, ordered_times, start_time)
-    plot_path = write_plot(
-        log_path,
-        stats,
-        ordered_times,
-        start_time,
-        summary,
-        SHOW_ENABLED,
-        residual_threshold,
-        plot_threshold,
-    )
-    if args.show and not SHOW_ENABLED:
-        print("Display not available; saved plot instead of showing it.")
+    summary = summarize_stats(stats, residual_threshold)
+    csv_path = write_csv(log_path, stats, ordered_utcs)
     print(f"Wrote {csv_path}")
-    print(f"Wrote {plot_path}")
+    if not args.no_plot:
+        plot_path = write_plot(
+            log_path,
+            stats,
+            summary,
+            show_enabled,
+            residual_threshold,
+            plot_threshold,
+        )
+        if args.show and not show_enabled:
+            print("Display not available; saved plot instead of showing it.")
+        print(f"Wrote {plot_path}")
     print(f"覆盖秒数: {summary['seconds']}")
     print(f"丢帧率: 均值 {summary['drop_rate_avg']:.3f}, 最大 {summary['drop_rate_max']:.3f}")
     print(f"退化比例: 均值 {summary['lio_ratio_avg']:.3f}, 最大 {summary['lio_ratio_max']:.3f}")
@@ -0,0 +1,113 @@
+import calendar
+
+import numpy as np
+import pytest
+
+from analyze_runtime_log import find_residual_segments, format_utc_labels, parse_log, write_csv
+
+GAPPED_LOG = b"""\
+[Image Use] utc=20251231_235958 img_time=1.000000 reason=stride stride=2 counter=1
+[Image Drop] utc=20251231_235958 img_time=1.100000 stride=2 counter=2
+[LIO Degenerate] utc=20251231_235958 degen_metric=residual avg_residual=0.011000 thresh_sigma=0.100000 \
+thresh_residual=0.012000 degen_count=0 degenerate=0
+[LIO Degenerate] utc=20251231_235958 degen_metric=residual avg_residual=0.014000 thresh_sigma=0.100000 \
+thresh_residual=0.012000 degen_count=1 degenerate=1
+[VIO Prune] utc=20251231_235958 reason=max_points voxel=(1.0,2.0,3.0) max_points=50
+some unrelated output line
+[LIO Degenerate] utc=20260101_000001 degen_metric=residual avg_residual=0.020000 thresh_sigma=0.100000 \
+thresh_residual=0.012000 degen_count=2 degenerate=1
+[VIO Prune] utc=20260101_000001 reason=age voxel=(1.0,2.0,3.0)
+[VIO Prune] utc=20260101_000001 reason=long_term_max_points voxel=(1.0,2.0,3.0)
+[Image Drop] utc=20260101_000001 img_time=4.000000 stride=2 counter=3
+[Image Use] utc=20260101_000003 img_time=6.000000 reason=keyframe stride=2 counter=4
+"""
+
+# Written by the original line-by-line parser for GAPPED_LOG.
+GAPPED_CSV = [
+    "utc,seconds_from_start,image_total,image_drop,image_drop_rate,lio_total,lio_degenerate,"
+    "lio_degenerate_ratio,lio_avg_residual,lio_max_residual,vio_prune_total,vio_prune_max_points,vio_prune_age",
+    "20251231_235958,0,2,1,0.500000,2,1,0.500000,0.012500,0.014000,1,1,0",
+    "20251231_235959,1,0,0,0.000000,0,0,0.000000,0.000000,0.000000,0,0,0",
+    "20260101_000000,2,0,0,0.000000,0,0,0.000000,0.000000,0.000000,0,0,0",
+    "20260101_000001,3,1,1,1.000000,1,1,1.000000,0.020000,0.020000,2,0,1",
+    "20260101_000002,4,0,0,0.000000,0,0,0.000000,0.000000,0.000000,0,0,0",
+    "20260101_000003,5,1,0,0.000000,0,0,0.000000,0.000000,0.000000,0,0,0",
+]
+
+
+def loop_residual_segments(times_sec, avg_residuals, threshold):
+    # The per-sample loop that find_residual_segments replaced.
+    if not times_sec:
+        return []
+    segments = []
+    above = avg_residuals[0] > threshold
+    start = times_sec[0] if above else None
+    for idx in range(1, len(times_sec)):
+        v0 = avg_residuals[idx - 1]
+        v1 = avg_residuals[idx]
+        t0 = times_sec[idx - 1]
+        t1 = times_sec[idx]
+        if not above and v1 > threshold:
+            t_cross = t0 if v1 == v0 else t0 + (threshold - v0) * (t1 - t0) / (v1 - v0)
+            start = t_cross
+            above = True
+        elif above and v1 <= threshold:
+            t_cross = t0 if v1 == v0 else t0 + (threshold - v0) * (t1 - t0) / (v1 - v0)
+            segments.append((start, t_cross))
+            above = False
+    if above and start is not None:
+        segments.append((start, times_sec[-1]))
+    return segments
+
+
+def test_format_utc_labels_crosses_day_and_year():
+    start_epoch = calendar.timegm((2025, 12, 31, 23, 59, 58, 0, 0, 0))
+
+    assert format_utc_labels(start_epoch, 4) == [
+        "20251231_235958",
+        "20251231_235959",
+        "20260101_000000",
+        "20260101_000001",
+    ]
+
+
+def test_parse_log_writes_gap_seconds(tmp_path):
+    log_path = tmp_path / "runtime_log_20251231_235958.txt"
+    log_path.write_bytes(GAPPED_LOG)
+
+    stats, ordered_utcs, residual_threshold = parse_log(log_path)
+    csv_path = write_csv(log_path, stats, ordered_utcs)
+
+    assert residual_threshold == 0.012
+    assert csv_path.read_bytes() == "".join(line + "\r\n" for line in GAPPED_CSV).encode("ascii")
+
+
+@pytest.mark.parametrize(
+    "avg_residuals",
+    [
+        [],
+        [0.02],
+        [0.0, 0.0, 0.0],
+        [0.02, 0.02, 0.0, 0.0, 0.02],
+        [0.0, 0.013, 0.013, 0.011, 0.013],
+        [0.013, 0.0, 0.02, 0.013, 0.012, 0.0125, 0.014],
+    ],
+)
+def test_find_residual_segments_matches_loop(avg_residuals):
+    times_sec = [float(index) for index in range(len(avg_residuals))]
+
+    np.testing.assert_allclose(
+        np.reshape(find_residual_segments(times_sec, avg_residuals, 0.013), (-1, 2)),
+        np.reshape(loop_residual_segments(times_sec, avg_residuals, 0.013), (-1, 2)),
+    )
+
+
+def test_find_residual_segments_matches_loop_on_noise():
+    rng = np.random.default_rng(0)
+    avg_residuals = rng.normal(0.013, 0.002, 2000).round(4).tolist()
+    times_sec = [float(index) for index in range(len(avg_residuals))]
+
+    np.testing.assert_allclose(
+        np.reshape(find_residual_segments(times_sec, avg_residuals, 0.013), (-1, 2)),
+        np.reshape(loop_residual_segments(times_sec, avg_residuals, 0.013), (-1, 2)),
+    )